@@ -1,8 +1,15 @@
 import duckdb
 import datetime
-from typing import List
+import functools
+import itertools
+import threading
+import uuid
+from contextlib import contextmanager
+from operator import itemgetter
+from pathlib import Path
 import os
 import pandas as pd
+import pyarrow.csv as pacsv
 
 from fastapi.middleware.cors import CORSMiddleware  # <-- Add this import
 
@@ -13,6 +20,12 @@ OUTPUT_TABLE = "forecast_results"
 
 OUTPUT_DIR = "output"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+OUTPUT_PATH = Path(OUTPUT_DIR).resolve()
+
+# Bumped on every forecast_history insert; keys the forecast history caches.
+# All writes go through append_forecast_results in this process.
+FORECAST_VERSION = 0
+_forecast_version_lock = threading.Lock()
 
 conn = duckdb.connect(DUCKDB_FILE)
 
@@ -45,6 +58,26 @@ conn.execute(f"""
     )
 """)
 
+def _load_db_namespace() -> str:
+    """
+    Return the random id minted when the database file was created, minting it
+    on first use. Forecast ids restart at 1 if the file is recreated, so external
+    caches key on this as well.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS db_meta (namespace TEXT)")
+    row = conn.execute("SELECT namespace FROM db_meta").fetchone()
+    if row is not None:
+        return row[0]
+    namespace = uuid.uuid4().hex
+    conn.execute("INSERT INTO db_meta VALUES (?)", [namespace])
+    return namespace
+
+DB_NAMESPACE = _load_db_namespace()
+
+# Kept open for the life of the process: DuckDB caches the database instance while
+# a connection is alive, so get_connection() does not reopen the file per request.
+# The file lock this holds is why only the API process may touch the database.
+
 def get_connection():
     """
     Create and return a new DuckDB connection.
@@ -111,68 +144,143 @@ def preprocess_uploaded_file(file_path: str) -> str:
     df.to_csv(processed_path)
     return processed_path
 
-def get_all_data():
+@contextmanager
+def get_all_data(rows_per_batch: int = 64_000):
     """
-    Fetch all data from the DuckDB table.
+    Fetch all data from the DuckDB table as a stream of Arrow record batches.
+
+    Args:
+        rows_per_batch (int): Maximum number of rows per record batch.
+
+    Yields:
+        pyarrow.RecordBatchReader: Reader over the table, ordered by TANGGAL.
+                                   The connection stays open until the block exits.
     """
     conn = get_connection()  # Create a new connection
-    query = f"SELECT * FROM {DUCKDB_TABLE} ORDER BY TANGGAL"
-    df = conn.execute(query).fetchdf()
-    conn.close()  # Close the connection
-    return df
+    try:
+        query = f"SELECT * FROM {DUCKDB_TABLE} ORDER BY TANGGAL"
+        yield conn.execute(query).fetch_record_batch(rows_per_batch)
+    finally:
+        conn.close()  # Close the connection
 
-def get_data(target_product_id: str):
+def split_product_id(product_id: str) -> list:
     """
-    Fetch data for the specified product ID from the DuckDB table.
+    Split a product ID into its KODE_BARANG, KLASIFIKASI_BARANG, WARNA_BARANG
+    and UKURAN_BARANG parts.
+
+    Product IDs end up in output file names, so path separators and '..' are
+    rejected as well.
+
+    Raises:
+        ValueError: If the product ID is malformed.
     """
-    conn = get_connection()  # Create a new connection
-    try:
-        kode_barang, klasifikasi_barang, warna_barang, ukuran_barang = target_product_id.split("_")
-    except ValueError:
+    parts = product_id.split("_")
+    if (
+        len(parts) != 4
+        or not all(parts)
+        or any(bad in product_id for bad in ("/", "\\", ".."))
+    ):
         raise ValueError("Invalid target_product_id format. Expected format: KODE_BARANG_KLASIFIKASI_BARANG_WARNA_BARANG_UKURAN_BARANG")
+    return parts
 
-    query = f"""
-    SELECT * FROM {DUCKDB_TABLE}
-    WHERE KODE_BARANG = '{kode_barang}'
-      AND KLASIFIKASI_BARANG = '{klasifikasi_barang}'
-      AND WARNA_BARANG = '{warna_barang}'
-      AND UKURAN_BARANG = '{ukuran_barang}'
+def _product_filter(target_product_id: str, end_date=None):
     """
-    df = conn.execute(query).fetchdf()
+    Build the WHERE clause and parameters selecting one product's train data.
+    """
+    kode_barang, klasifikasi_barang, warna_barang, ukuran_barang = split_product_id(target_product_id)
+
+    where = """
+    WHERE KODE_BARANG = ?
+      AND KLASIFIKASI_BARANG = ?
+      AND WARNA_BARANG = ?
+      AND UKURAN_BARANG = ?
+    """
+    params = [kode_barang, klasifikasi_barang, warna_barang, ukuran_barang]
+    if end_date is not None:
+        where += "  AND TANGGAL <= CAST(? AS DATE)"
+        params.append(end_date)
+    return where, params
+
+def get_data(target_product_id: str, end_date=None):
+    """
+    Fetch data for the specified product ID from the DuckDB table.
+
+    Args:
+        target_product_id (str): The product ID to filter by.
+        end_date (str | date, optional): If given, only rows with TANGGAL on or
+                                         before this date are returned.
+
+    Returns:
+        pd.DataFrame: The matching train data.
+    """
+    where, params = _product_filter(target_product_id, end_date)
+    conn = get_connection()  # Create a new connection
+    df = conn.execute(f"SELECT * FROM {DUCKDB_TABLE} {where}", params).fetchdf()
     conn.close()  # Close the connection
     return df
 
-def append_forecast_results(product_id: str, rows: List[dict]):
+def append_forecast_results(product_id: str, df: pd.DataFrame) -> str:
+    """
+    Save forecast results to a CSV file and record it in the forecast history.
+
+    Args:
+        product_id (str): The product ID the forecast belongs to.
+        df (pd.DataFrame): Forecast with TANGGAL and TOTAL_JUMLAH columns.
+
+    Returns:
+        str: Path to the saved CSV file.
+
+    Raises:
+        ValueError: If the product ID is malformed or the forecast has no rows.
+    """
+    split_product_id(product_id)
+    if df.empty:
+        raise ValueError(f"Forecast for product {product_id} has no rows.")
+
     conn = get_connection()
+    try:
+        # DuckDB scans the DataFrame in place; no row-wise conversion in Python
+        conn.register("forecast_df", df)
+
+        # Determine the date range
+        date_start, date_end = conn.execute(
+            "SELECT MIN(TANGGAL)::DATE, MAX(TANGGAL)::DATE FROM forecast_df"
+        ).fetchone()
+
+        # Save results to a CSV file
+        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        csv_filename = f"{product_id}_{date_start}_to_{date_end}_{timestamp}.csv"
+        csv_path = os.path.join(OUTPUT_DIR, csv_filename)
+        if Path(csv_path).resolve().parent != OUTPUT_PATH:
+            raise ValueError(f"Refusing to write forecast outside {OUTPUT_DIR}: {csv_path}")
+        escaped_path = csv_path.replace("'", "''")
+        conn.execute(f"""
+        COPY (SELECT TANGGAL::DATE AS TANGGAL, TOTAL_JUMLAH FROM forecast_df)
+        TO '{escaped_path}' (HEADER)
+        """)
+
+        # Insert into forecast_history table
+        conn.execute(
+            f"""
+            INSERT INTO forecast_history (product_id, date_start, date_end, csv_path)
+            VALUES (?, ?, ?, ?)
+            """,
+            [product_id, date_start, date_end, csv_path]
+        )
+    finally:
+        conn.close()
 
-    # Determine the date range
-    date_start = min(row.TANGGAL for row in rows)
-    date_end = max(row.TANGGAL for row in rows)
-
-    # Save results to a CSV file
-    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    csv_filename = f"{product_id}_{date_start}_to_{date_end}_{timestamp}.csv"
-    csv_path = os.path.join(OUTPUT_DIR, csv_filename)
-    df = pd.DataFrame({
-        "TANGGAL": [row.TANGGAL for row in rows],
-        "TOTAL_JUMLAH": [row.TOTAL_JUMLAH for row in rows]
-    })
-    df.to_csv(csv_path, index=False)
-
-    # Insert into forecast_history table
-    conn.execute(
-        f"""
-        INSERT INTO forecast_history (product_id, date_start, date_end, csv_path)
-        VALUES (?, ?, ?, ?)
-        """,
-        [product_id, date_start, date_end, csv_path]
-    )
-    conn.close()
+    global FORECAST_VERSION
+    with _forecast_version_lock:
+        FORECAST_VERSION += 1
+    return csv_path
 
 def get_history_forecast(as_dict: bool = False):
     """
     Fetch the forecast history from the database.
 
+    Results are cached until forecast_history changes.
+
     Args:
         as_dict (bool): If True, return the result as a list of dictionaries. 
                         Otherwise, return as a list of tuples.
@@ -180,6 +288,10 @@ def get_history_forecast(as_dict: bool = False):
     Returns:
         List[dict] or List[tuple]: The forecast history data.
     """
+    return _load_history_forecast(FORECAST_VERSION, as_dict)
+
+@functools.lru_cache(maxsize=4)
+def _load_history_forecast(version: int, as_dict: bool):
     conn = get_connection()
     query = f"""
     SELECT id, product_id, 
@@ -200,6 +312,26 @@ def get_history_forecast(as_dict: bool = False):
     conn.close()
     return result
 
+def get_history_forecast_indexed():
+    """
+    Fetch the forecast history grouped by product ID.
+
+    The index is built once per version of forecast_history, so a per-product
+    lookup is a dict access instead of a scan over the full history.
+
+    Returns:
+        dict[str, List[dict]]: Forecast history rows keyed by product ID.
+    """
+    return _build_history_forecast_index(FORECAST_VERSION)
+
+@functools.lru_cache(maxsize=4)
+def _build_history_forecast_index(version: int):
+    sorted_rows = sorted(_load_history_forecast(version, True), key=itemgetter("product_id"))
+    return {
+        product_id: list(group)
+        for product_id, group in itertools.groupby(sorted_rows, key=itemgetter("product_id"))
+    }
+
 def get_forecast_by_id(forecast_id: int):
     """
     Fetch forecast results by ID.
@@ -229,7 +361,7 @@ def get_train_data_by_product_id(start_data: str, end_date:str, product_id: str)
         product_id (str): The product ID to filter by.
 
     Returns:
-        List[dict]: A list of dictionaries containing the train data.
+        dict: The train data in split layout, {"columns": [...], "data": [[...], ...]}.
     """
     conn = get_connection()
     kode_barang, klasifikasi_barang, warna_barang, ukuran_barang = product_id.split("_")
@@ -250,7 +382,7 @@ def get_train_data_by_product_id(start_data: str, end_date:str, product_id: str)
     columns = [desc[0] for desc in cursor.description]
     conn.close()
     
-    return [dict(zip(columns, row)) for row in result]
+    return {"columns": columns, "data": result}
 
 def get_forecast_history_by_id(forecast_id: int):
     """
@@ -271,10 +403,14 @@ def get_forecast_history_by_id(forecast_id: int):
     df = conn.execute(query).fetchdf()
 
     csv_path = df['csv_path'].values[0]
-    df_forecast = pd.read_csv(csv_path)
+    # Read the worker's output with Arrow's typed reader; TANGGAL comes back as date32
+    forecast_table = pacsv.read_csv(csv_path)
 
-    # Convert the DataFrame to a list of dictionaries
-    df_forecast = df_forecast.to_dict(orient='records')
+    # Columns + row values, without repeating keys per row
+    df_forecast = {
+        "columns": forecast_table.column_names,
+        "data": list(zip(*forecast_table.to_pydict().values())),
+    }
 
     data = {
         "product_id": df['product_id'].values[0],
@@ -1,35 +1,59 @@
+import io
+import os
+from stat import S_ISREG
 
+import orjson
+import pyarrow.csv as pacsv
+import pyarrow.ipc as paipc
+import redis
+import redis.asyncio as aioredis
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+
+from .db import DB_NAMESPACE, OUTPUT_PATH, split_product_id
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024
+FORECAST_CACHE_TTL = 24 * 60 * 60  # Forecast records never change once written
+
+redis_host = os.getenv("REDIS_HOST", "localhost")
+# DB 0 is the Celery broker/backend; cached responses live in DB 1
+redis_client = aioredis.Redis.from_url(f"redis://{redis_host}:6379/1", socket_timeout=1)
 
 @router.get("/forecast-history/")
-def get_forecast_history():
+async def get_forecast_history():
     """
     Endpoint to get the forecast history.
     """
     try:
-        history = get_history_forecast()
-        return JSONResponse(history)
+        history = await run_in_threadpool(get_history_forecast)
+        return ORJSONResponse(history)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/forecast/{product_id}")
-def get_forecast(
+async def get_forecast(
         product_id: str,
     ):
     """
     Endpoint to get the forecast history for a specific product ID.
     """
     try:
-        history = get_history_forecast(as_dict=True)
-        filtered_history = [entry for entry in history if entry["product_id"] == product_id]
+        index = await run_in_threadpool(get_history_forecast_indexed)
+        filtered_history = index.get(product_id)
         if not filtered_history:
             raise HTTPException(status_code=404, detail="No forecast data found for the specified product ID.")
-        return JSONResponse(filtered_history)
+        return ORJSONResponse(filtered_history)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 # get train data
 @router.get("/train-data/{product_id}")
-def get_train_data(
+async def get_train_data(
     product_id: str,
     start_date: date,
     end_date: date
@@ -38,10 +62,12 @@ def get_train_data(
     Endpoint to get the train data for a specific product ID.
     """
     try:
-        res = get_train_data_by_product_id(start_date, end_date, product_id)
-        if len(res) == 0:
+        res = await run_in_threadpool(get_train_data_by_product_id, start_date, end_date, product_id)
+        if not res["data"]:
             raise HTTPException(status_code=404, detail="No train data found.")
-        return JSONResponse(res)
+        return ORJSONResponse(res)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -50,36 +76,92 @@ async def download_file(filename: str):
     """
     Endpoint to download a file.
     """
-    file_path = os.path.join(OUTPUT_DIR, filename)
-    if not os.path.exists(file_path):
+    file_path = (OUTPUT_PATH / filename).resolve()
+    if OUTPUT_PATH not in file_path.parents:
+        raise HTTPException(status_code=400, detail="Invalid filename.")
+    try:
+        stat_result = file_path.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found.")
+    if not S_ISREG(stat_result.st_mode):
         raise HTTPException(status_code=404, detail="File not found.")
     
-    return FileResponse(file_path, media_type='application/octet-stream', filename=filename)
+    # Passing stat_result spares Starlette a second stat before sending
+    response = FileResponse(
+        file_path,
+        media_type='application/octet-stream',
+        filename=filename,
+        stat_result=stat_result,
+    )
+    response.chunk_size = DOWNLOAD_CHUNK_SIZE
+    return response
 
 @router.get("/forecast-history/{forecast_id}")
 async def get_forecast_by_id(forecast_id: int):
     """
     Endpoint to get forecast results by ID.
+    Responses are cached in Redis; a Redis outage only disables the cache.
     """
+    cache_key = f"fh:{DB_NAMESPACE}:{forecast_id}"
     try:
-        data = get_forecast_history_by_id(forecast_id)
+        cached = await redis_client.get(cache_key)
+    except redis.RedisError:
+        cached = None
+    if cached:
+        return Response(cached, media_type="application/json")
 
-        return JSONResponse(data)
+    try:
+        data = await run_in_threadpool(get_forecast_history_by_id, forecast_id)
+        body = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+
+        try:
+            await redis_client.set(cache_key, body, ex=FORECAST_CACHE_TTL)
+        except redis.RedisError:
+            pass
+
+        return Response(body, media_type="application/json")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/all-train-data")
-async def get_all_train_data():
+async def get_all_train_data(request: Request):
     """
     Endpoint to get all train data.
-    Stream as CSV for better performance.
+    Stream as an Arrow IPC stream when the client accepts it, otherwise as CSV.
     """
     try:
-        df = get_all_data()
+        def drain(sink: io.BytesIO):
+            # Hand out the buffered bytes in chunks of at most STREAM_CHUNK_SIZE
+            with sink.getbuffer() as view:
+                chunks = [bytes(view[i:i + STREAM_CHUNK_SIZE]) for i in range(0, len(view), STREAM_CHUNK_SIZE)]
+            sink.seek(0)
+            sink.truncate()
+            return chunks
+
+        def iter_arrow():
+            with get_all_data() as reader:
+                sink = io.BytesIO()
+                with paipc.new_stream(sink, reader.schema) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch)
+                        yield from drain(sink)
+                # End-of-stream marker written on close
+                yield from drain(sink)
 
         def iter_csv():
-            yield df.to_csv(index=False)
+            with get_all_data() as reader:
+                sink = io.BytesIO()
+                # The writer emits the header once; small batches are coalesced before flushing
+                with pacsv.CSVWriter(sink, reader.schema) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch)
+                        if sink.tell() >= STREAM_CHUNK_SIZE:
+                            yield from drain(sink)
+                yield from drain(sink)
+
+        if ARROW_STREAM_MEDIA_TYPE in request.headers.get("accept", ""):
+            return StreamingResponse(iter_arrow(), media_type=ARROW_STREAM_MEDIA_TYPE)
 
         return StreamingResponse(
             iter_csv(),
@@ -88,4 +170,29 @@ async def get_all_train_data():
         )
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/internal/forecast-results")
+async def store_forecast_results(request: Request):
+    """
+    Internal endpoint for the Celery worker to store a finished forecast.
+    The body is an Arrow IPC stream with TANGGAL and TOTAL_JUMLAH columns and
+    the product ID travels in the X-Product-Id header.
+    """
+    product_id = request.headers.get("x-product-id")
+    if not product_id:
+        raise HTTPException(status_code=400, detail="Missing X-Product-Id header.")
+    try:
+        split_product_id(product_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        body = await request.body()
+        df = paipc.open_stream(body).read_pandas()
+        csv_path = await run_in_threadpool(append_forecast_results, product_id, df)
+        return ORJSONResponse({"status": "success", "output_file": csv_path})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
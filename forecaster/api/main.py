@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from .middleware import LimitUploadSizeMiddleware
 from .endpoints import router
 
@@ -9,6 +9,7 @@ app = FastAPI(
     title="CSV Processing API",
     description="An API to upload CSV files, process them asynchronously, and download the results.",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 # Add middleware
@@ -24,7 +25,7 @@ app.add_middleware(
 # Global error handler for 500 Internal Server Error
 @app.exception_handler(Exception)
 async def internal_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "Internal server error", "error": str(exc)},
     )
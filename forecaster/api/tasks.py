@@ -1,9 +1,15 @@
 import os, requests
+import logging
+import pyarrow as pa
+import pyarrow.ipc as paipc
 from celery import Celery
 from kp_forecaster.pipeline import run_bma_pipeline
 
+logger = logging.getLogger(__name__)
+
 redis_host = os.getenv("REDIS_HOST", "localhost")
 FASTAPI_URL = os.getenv("FASTAPI_URL", "http://localhost:8000")
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
 
 celery = Celery(
     "tasks",
@@ -27,17 +33,20 @@ def process_csv_task(filepath: str, target_product_id: str, future_step: int = 0
     if start_date and end_date:
         future_df = future_df[(future_df["TANGGAL"] >= start_date) & (future_df["TANGGAL"] <= end_date)]
 
-    # Convert TANGGAL (Timestamp) to ISO‐formatted string for JSON serialization
-    future_df["TANGGAL"] = future_df["TANGGAL"].dt.strftime("%Y-%m-%d")
-
-    payload = {
-        "product_id": target_product_id,
-        "results": future_df.to_dict(orient="records")
-    }
-
-    print(f"payload: {payload}")
+    if future_df.empty:
+        return {"status": "failed"}
 
-    resp = requests.post(f"{FASTAPI_URL}/internal/store-forecast", json=payload)
+    # The API process owns the DuckDB file, so hand the forecast over as an Arrow IPC stream
+    table = pa.Table.from_pandas(future_df[["TANGGAL", "TOTAL_JUMLAH"]], preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with paipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    logger.debug("Sending forecast: product_id=%s rows=%d", target_product_id, len(future_df))
+    resp = requests.post(
+        f"{FASTAPI_URL}/internal/forecast-results",
+        data=sink.getvalue().to_pybytes(),
+        headers={"Content-Type": ARROW_STREAM_MEDIA_TYPE, "X-Product-Id": target_product_id},
+    )
     resp.raise_for_status()
     return resp.json()
-
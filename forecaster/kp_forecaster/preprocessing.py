@@ -2,7 +2,12 @@ import pandas as pd
 from kp_forecaster.config import PRODUCT_ID_COLS, TARGET_COLUMN, DATE_COLUMN, RESAMPLE_FREQ
 
 def load_and_prepare_data(file_path):
-    df = pd.read_csv(file_path, parse_dates=[DATE_COLUMN])
+    if str(file_path).lower().endswith('.parquet'):
+        # Parquet keeps dtypes; DATE columns may still come back as datetime.date objects
+        df = pd.read_parquet(file_path)
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN])
+    else:
+        df = pd.read_csv(file_path, parse_dates=[DATE_COLUMN])
     for col in PRODUCT_ID_COLS:
         df[col] = df[col].astype(str)
     df['PRODUCT_ID'] = df[PRODUCT_ID_COLS].agg('_'.join, axis=1)